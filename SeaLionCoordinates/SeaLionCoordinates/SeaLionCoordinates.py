@@ -12,6 +12,7 @@ import glob
 import csv 
 from math import sqrt
 import random
+import multiprocessing
 
 import numpy as np
 
@@ -69,6 +70,8 @@ DATADIR = os.path.join('..', 'C:\\temp\\sealion\\chunks')
 
 VERBOSITY = namedtuple('VERBOSITY', ['QUITE', 'NORMAL', 'VERBOSE', 'DEBUG'])(0,1,2,3)
 
+NEGATIVE_STRATEGIES = ('uniform', 'stratified', 'hard')
+
 
 SeaLionCoord = namedtuple('SeaLionCoord', ['tid', 'cls', 'x', 'y'])
 
@@ -119,6 +122,7 @@ class SeaLionData(object):
             'test'       : os.path.join(sourcedir, 'Test', '{tid}.jpg'),
             # Data paths
             'coords'     : os.path.join(datadir, 'coords.csv'),  
+            'bad_ids'    : os.path.join(datadir, 'bad_train_ids.csv'),
             }
         
         # From MismatchedTrainImages.txt
@@ -130,6 +134,10 @@ class SeaLionData(object):
             913, 927, 946)
             
         self._counts = None
+        self._bad_ids = None
+        # Thumbnail difference above which a train/dotted pair is mismatched.
+        # None: calibrated against bad_train_ids by save_bad_train_ids()
+        self.bad_diff_threshold = None
 
         
     @property
@@ -141,7 +149,7 @@ class SeaLionData(object):
     def train_ids(self):
         """List of all valid train ids"""
         tids = range(0, self.train_nb)
-        tids = list(set(tids) - set(self.bad_train_ids) )  # Remove bad ids
+        tids = list(set(tids) - set(self.bad_train_ids) - set(self.bad_ids) )  # Remove bad ids
         tids.sort()
         return tids
                     
@@ -168,6 +176,17 @@ class SeaLionData(object):
             self._counts = counts
         return self._counts
 
+    @property
+    def bad_ids(self):
+        """Train ids flagged by save_bad_train_ids, or empty if never run"""
+        if self._bad_ids is None :
+            fn = self.path('bad_ids')
+            if os.path.exists(fn) :
+                self._bad_ids = self.load_bad_train_ids()
+            else :
+                self._bad_ids = []
+        return self._bad_ids
+
     def rmse(self, tid_counts) :
         true_counts = self.counts
         
@@ -184,33 +203,73 @@ class SeaLionData(object):
         return rmse 
         
 
-    def load_train_image(self, train_id, border=0, mask=False):
+    def load_train_image(self, train_id, border=0, mask=False, mask_scale=1/4):
         """Return image as numpy array
          
         border -- add a black border of this width around image
         mask -- If true mask out masked areas from corresponding dotted image
+        mask_scale -- Resolution at which the dotted image is decoded for the mask
         """
         img = self._load_image('train', train_id, border)
         if mask :
-            # The masked areas are not uniformly black, presumable due to 
-            # jpeg compression artifacts
-            dot_img = self._load_image('dotted', train_id, border).astype(np.uint16).sum(axis=-1)
             img = np.copy(img)
-            img[dot_img<40] = 0
+            img[self.load_mask(train_id, border, mask_scale)] = 0
         return img
    
 
-    def load_dotted_image(self, train_id, border=0):
-        return self._load_image('dotted', train_id, border)
+    def load_dotted_image(self, train_id, border=0, scale=1):
+        return self._load_image('dotted', train_id, border, scale)
  
  
-    def load_test_image(self, test_id, border=0):    
-        return self._load_image('test', test_id, border)
+    def load_test_image(self, test_id, border=0, scale=1):    
+        return self._load_image('test', test_id, border, scale)
 
 
-    def _load_image(self, itype, tid, border=0) :
+    def load_mask(self, train_id, border=0, scale=1/4):
+        """Return full resolution boolean array, True over the blacked out areas 
+        of the dotted image. 
+
+        The masked areas are large, so the dotted image is only decoded at 
+        reduced resolution and the mask scaled back up.
+        """
+        # The masked areas are not uniformly black, presumable due to 
+        # jpeg compression artifacts
+        dot_img = self._load_image('dotted', train_id, scale=scale).astype(np.uint16).sum(axis=-1)
+        mask = dot_img < 40
+        reduce = int(round(1/scale))
+        if reduce > 1 :
+            mask = mask.repeat(reduce, axis=0).repeat(reduce, axis=1)
+        with Image.open(self.path('dotted', tid=train_id)) as dot_file :   # Only reads header
+            width, height = dot_file.size
+        mask = mask[:height, :width]
+        if border :
+            bmask = np.zeros( shape=(height+border*2, width+border*2), dtype=bool)
+            bmask[border:-border, border:-border] = mask
+            mask = bmask
+        return mask
+
+
+    def _load_image(self, itype, tid, border=0, scale=1) :
+        """Return image as numpy array
+
+        scale -- One of 1, 1/2, 1/4 or 1/8. Reduced scales are decoded directly 
+            by the jpeg decoder (DCT domain downscaling), which is several times 
+            faster and smaller than a full decode. Border width is in scaled pixels.
+        """
         fn = self.path(itype, tid=tid)
-        img = np.asarray(Image.open(fn))
+        img = Image.open(fn)
+        if scale != 1 :
+            reduce = int(round(1/scale))
+            if reduce not in (2, 4, 8) :
+                raise ValueError('scale must be one of 1, 1/2, 1/4 or 1/8')
+            width, height = img.size
+            size = (-(-width//reduce), -(-height//reduce))
+            # Draft picks the largest reduction whose output is at least the 
+            # requested size, and jpeg output rounds up, so ask for the floor.
+            img.draft('RGB', (width//reduce, height//reduce))
+            if img.size != size:    # Not draft decoded, e.g. not a jpeg
+                img = img.resize(size, Image.BILINEAR)
+        img = np.asarray(img)
         if border :
             height, width, channels = img.shape
             bimg = np.zeros( shape=(height+border*2, width+border*2, channels), dtype=np.uint8)
@@ -219,8 +278,115 @@ class SeaLionData(object):
         return img
     
 
-    def coords(self, train_id):
-        """Extract coordinates of dotted sealions and return list of SeaLionCoord objects)"""
+    def thumbnail_diff(self, train_id, scale=1/8):
+        """Average difference between low resolution thumbnails of a train/dotted pair.
+
+        Uses the jpeg decoder's draft mode, so only a reduced scale image is
+        ever decoded. Downscaling averages away the dots, so the value is not
+        comparable to the full resolution MAX_AVG_DIFF in coords().
+        """
+        src_img = self._load_image('train', train_id, scale=scale).astype(np.int16)
+        dot_img = self._load_image('dotted', train_id, scale=scale).astype(np.int16)
+
+        # Different sized images can't be a matching pair
+        if src_img.shape != dot_img.shape: return np.inf
+
+        src_img = np.copy(src_img)
+        src_img[dot_img.sum(axis=-1) < 40] = 0
+
+        img_diff = np.abs(src_img - dot_img)
+        return img_diff.sum() / (img_diff.shape[0] * img_diff.shape[1])
+
+
+    def is_bad_train_image(self, train_id, scale=1/8):
+        """Returns True if the train/dotted pair looks mismatched"""
+        if self.bad_diff_threshold is None and os.path.exists(self.path('bad_ids')) :
+            self._bad_ids = self.load_bad_train_ids()     # Also loads threshold
+        if self.bad_diff_threshold is None :
+            raise ValueError('bad_diff_threshold not set, run save_bad_train_ids() first')
+        return bool(self.thumbnail_diff(train_id, scale) > self.bad_diff_threshold)
+
+
+    def calibrate_bad_threshold(self, diffs):
+        """Thumbnail difference threshold that best reproduces the hand 
+        maintained bad_train_ids, given a map from train_id to thumbnail_diff.
+
+        Minimizes misclassified ids; ties go to the threshold flagging the 
+        fewest ids, so a metric with no signal doesn't flag everything.
+        """
+        tids = sorted(diffs)
+        values = np.array([diffs[tid] for tid in tids])
+        known_bad = np.array([tid in self.bad_train_ids for tid in tids])
+        if known_bad.all() or not known_bad.any() :
+            raise ValueError('Need both known bad and good train ids to calibrate')
+
+        finite = np.unique(values[np.isfinite(values)])
+        if len(finite) == 0 :
+            raise ValueError('No train/dotted pair has matching image sizes, cannot calibrate')
+        cuts = np.concatenate([[finite[0] - 1], (finite[:-1] + finite[1:]) / 2, [finite[-1] + 1]])
+        flagged = values[None, :] > cuts[:, None]
+        errors = (flagged != known_bad[None, :]).sum(axis=1)
+        best = np.flatnonzero(errors == errors.min())
+        # Cuts ascend, so the last best cut flags fewest ids
+        return float(cuts[best[-1]])
+
+
+    def save_bad_train_ids(self, train_ids=None, scale=1/8):
+        """Quick validation pass over train/dotted pairs. Mismatched ids are
+        saved and subsequently excluded from train_ids.
+        
+        If bad_diff_threshold is not set it is first calibrated against the 
+        known bad_train_ids, and the agreement reported.
+        """
+        if train_ids is None: train_ids = range(0, self.train_nb)
+        fn = self.path('bad_ids')
+        self._progress('Saving bad train ids to {}'.format(fn))
+        diffs = {}
+        for tid in train_ids :
+            self._progress()
+            diffs[tid] = self.thumbnail_diff(tid, scale)
+
+        if self.bad_diff_threshold is None :
+            self.bad_diff_threshold = self.calibrate_bad_threshold(diffs)
+            known = set(self.bad_train_ids) & set(diffs)
+            flagged = set(tid for tid in diffs if diffs[tid] > self.bad_diff_threshold)
+            self._progress('\nCalibrated threshold {:.2f}: flags {} of {} known bad ids, {} others'.format(
+                self.bad_diff_threshold, len(flagged & known), len(known), len(flagged - known)), end='\n')
+
+        bad_ids = [tid for tid in sorted(diffs) if diffs[tid] > self.bad_diff_threshold]
+        for tid in bad_ids :
+            self._progress(' Bad train id {}'.format(tid), end='\n', verbosity=VERBOSITY.VERBOSE)
+        with open(fn, 'w') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow( ['threshold', repr(self.bad_diff_threshold)] )
+            writer.writerow( ['tid'] )
+            for tid in bad_ids :
+                writer.writerow( [tid] )
+        self._bad_ids = bad_ids
+        self._progress('done')
+        return bad_ids
+
+    def load_bad_train_ids(self):
+        """Load ids saved by save_bad_train_ids, and the threshold they were 
+        flagged with if bad_diff_threshold isn't already set."""
+        fn = self.path('bad_ids')
+        self._progress('Loading bad train ids from {}'.format(fn))
+        with open(fn) as f:
+            header = f.readline().strip().split(',')
+            if header[0] == 'threshold' :
+                if self.bad_diff_threshold is None :
+                    self.bad_diff_threshold = float(header[1])
+                f.readline()
+            return [int(line) for line in f if line.strip()]
+
+
+    def coords(self, train_id, seed=0, strategy='uniform'):
+        """Extract coordinates of dotted sealions and return list of SeaLionCoord objects)
+
+        seed -- Run seed. Negative examples are sampled with a generator seeded 
+            from (seed, train_id), so results don't depend on run order.
+        strategy -- Negative sampling strategy, one of NEGATIVE_STRATEGIES
+        """
         
         # Empirical constants
         MIN_DIFFERENCE = 16
@@ -270,45 +436,13 @@ class SeaLionData(object):
 
         # Start finding negative examples.
 
-        numLions = len(sealions)
-
-        CHUNK_STEP = 120
-        CHUNK_SIZE = 92
-        max_x = src_img.shape[1]
-        max_y = src_img.shape[0]
-        #numxcoords = (max_x - CHUNK_STEP // 2) // CHUNK_STEP
-        #numycoords = (max_y - CHUNK_STEP // 2) // CHUNK_STEP
-        numxcoords = (max_x // CHUNK_STEP) - 1
-        numycoords = (max_y // CHUNK_STEP) - 1
-        negatives = []
-        for j in range(numycoords) :
-            for i in range(numxcoords) : 
-
-                xcoord = i * CHUNK_STEP
-                ycoord = j * CHUNK_STEP
-                overlap = False
-                for tid, cls, x, y in sealions :
-                    if np.abs(x - xcoord) < CHUNK_STEP and np.abs(y - ycoord) < CHUNK_STEP : 
-                        overlap = True
-                        break
-                if overlap : continue
-
-                    #elif np.abs(lion.x - xcoord) < CHUNK_STEP or np.abs(lion.y - ycoord) < CHUNK_STEP : 
-                    #    print("check passed: new: [{xn},{yn}] lion: [{xl},{yl}] dist: [{xd},{yd}]".format(xn=xcoord,yn=ycoord,xl=lion.x,yl=lion.y,xd=np.abs(lion.x-xcoord),yd=np.abs(lion.y-ycoord)))
-                    #if (lion.x > xcoord and lion.x < xcoord + CHUNK_STEP) or (lion.y > ycoord and lion.y < ycoord + CHUNK_STEP): continue
-                   
-            #Add in good results; REMOVE BLACK MASK.
-                MIN_AVG_DATA = 200
-                neg_img = dot_img[ycoord:ycoord+CHUNK_SIZE,xcoord:xcoord+CHUNK_SIZE,:]
-                #neg_img = dot_img[xcoord:xcoord+CHUNK_SIZE,ycoord:ycoord+CHUNK_SIZE,:]
-                neg_avg = neg_img.sum() / (neg_img.shape[0] * neg_img.shape[1])
-                if neg_avg < MIN_AVG_DATA: continue
-
-                negatives.append( SeaLionCoord(train_id, 5, xcoord ,ycoord ) )
+        # Full resolution dotted image is already in memory, build exact table from it
+        brightness = self.brightness_table(train_id, dot_img=dot_img)
+        negatives = self.negative_coords(train_id, sealions, brightness=brightness)
 
         #add in only one result for each sea lion
-        while len(negatives) > len(sealions):
-            del negatives[random.randint(0,len(negatives) - 1)]
+        rng = self.negative_rng(train_id, seed)
+        negatives = self.sample_negatives(negatives, sealions, len(sealions), rng, strategy)
 
         sealions = sealions + negatives
 
@@ -325,7 +459,7 @@ class SeaLionData(object):
             print(train_id, true_counts, counts, np.array(true_counts) - np.array(counts) , sep='\t' )
           
         if self.verbosity == VERBOSITY.DEBUG :
-            img = np.copy(sld.load_dotted_image(train_id))
+            img = np.copy(self.load_dotted_image(train_id))
             r = self.dot_radius
             dy,dx,c = img.shape
             for tid, cls, cx, cy in sealions :                    
@@ -338,17 +472,164 @@ class SeaLionData(object):
         return sealions
         
 
-    def save_coords(self, train_ids=None): 
+    def brightness_table(self, train_id, scale=1/4, dot_img=None):
+        """Summed-area table of the dotted image brightness (sum over channels).
+
+        Returns (table, scale, (width, height)), where table[y, x] is the 
+        brightness sum of all scaled pixels above and left of (y, x), and 
+        (width, height) the full resolution image size.
+
+        dot_img -- Full resolution dotted image, if already loaded. The table is
+            then exact (scale 1) and nothing is decoded. Otherwise the dotted 
+            image is decoded at reduced scale.
+        """
+        if dot_img is not None :
+            scale = 1
+            height, width = dot_img.shape[:2]
+            img = np.asarray(dot_img).sum(axis=-1).astype(np.int64)
+        else :
+            with Image.open(self.path('dotted', tid=train_id)) as dot_file :
+                width, height = dot_file.size
+            img = self.load_dotted_image(train_id, scale=scale).astype(np.int64).sum(axis=-1)
+        table = np.zeros( shape=(img.shape[0]+1, img.shape[1]+1), dtype=np.int64)
+        table[1:, 1:] = img.cumsum(axis=0).cumsum(axis=1)
+        return table, scale, (width, height)
+
+
+    def negative_coords(self, train_id, sealions, chunk_size=92, chunk_step=120, brightness=None):
+        """Return list of candidate negative example SeaLionCoords. 
+
+        Candidates lie on a grid with spacing chunk_step, away from any sea lion, 
+        and the chunk_size square must not be mostly black mask. Brightness of
+        every cell is read from one summed-area table, so grids may be dense
+        and overlapping (chunk_step < chunk_size). 
+
+        brightness -- Result of brightness_table(), to reuse it across grids. 
+            Decoded at 1/4 scale if not given.
+        """
+        MIN_AVG_DATA = 200
+
+        if brightness is None: brightness = self.brightness_table(train_id)
+        table, scale, (max_x, max_y) = brightness
+        reduce = int(round(1/scale))
+        # Scaled table is ceil sized; max_x, max_y are the true image size
+        height, width = table.shape[0]-1, table.shape[1]-1
+
+        # Keep whole chunk inside image
+        numxcoords = min((max_x // chunk_step) - 1, (max_x - chunk_size) // chunk_step + 1)
+        numycoords = min((max_y // chunk_step) - 1, (max_y - chunk_size) // chunk_step + 1)
+        ycoords, xcoords = np.meshgrid(np.arange(numycoords) * chunk_step, 
+                                       np.arange(numxcoords) * chunk_step, indexing='ij')
+        ycoords = ycoords.ravel()
+        xcoords = xcoords.ravel()
+
+        # Remove cells too close to a sea lion
+        keep = np.ones(len(xcoords), dtype=bool)
+        if sealions :
+            dist = max(chunk_step, chunk_size)
+            lion_x = np.array([c.x for c in sealions])
+            lion_y = np.array([c.y for c in sealions])
+            overlap = (np.abs(lion_x[None, :] - xcoords[:, None]) < dist) & \
+                      (np.abs(lion_y[None, :] - ycoords[:, None]) < dist)
+            keep &= ~overlap.any(axis=1)
+
+        #Add in good results; REMOVE BLACK MASK.
+        # Chunk corners in scaled pixels, rounded to nearest
+        y0 = np.clip((ycoords + reduce//2) // reduce, 0, height)
+        x0 = np.clip((xcoords + reduce//2) // reduce, 0, width)
+        y1 = np.clip((ycoords + chunk_size + reduce//2) // reduce, 0, height)
+        x1 = np.clip((xcoords + chunk_size + reduce//2) // reduce, 0, width)
+        area = np.maximum((y1 - y0) * (x1 - x0), 1)
+        neg_sum = table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0]
+        neg_avg = neg_sum / area
+        keep &= neg_avg >= MIN_AVG_DATA
+
+        return [SeaLionCoord(train_id, 5, int(x), int(y)) for x, y in zip(xcoords[keep], ycoords[keep])]
+        
+
+    def negative_rng(self, train_id, seed=0):
+        """Random generator for negative sampling of one train image"""
+        return np.random.RandomState([seed, train_id])
+
+
+    def sample_negatives(self, negatives, sealions, number, rng, strategy='uniform'):
+        """Downsample candidate negatives to at most number examples.
+
+        strategy -- 
+            'uniform' : every candidate equally likely
+            'stratified' : spread evenly over a grid of image regions
+            'hard' : favour candidates close to a sea lion
+        Returned negatives keep their original (grid) order.
+        """
+        REGIONS = 4         # stratified: REGIONS x REGIONS grid over the image
+        HARD_SCALE = 240    # hard: distance scale (pixels) of the preference for nearby cells
+
+        if strategy not in NEGATIVE_STRATEGIES :
+            raise ValueError('Unknown negative sampling strategy: {}'.format(strategy))
+        if len(negatives) <= number: return list(negatives)
+        if number <= 0: return []
+
+        xs = np.array([c.x for c in negatives])
+        ys = np.array([c.y for c in negatives])
+
+        if strategy == 'uniform' :
+            idx = rng.choice(len(negatives), number, replace=False)
+
+        elif strategy == 'stratified' :
+            # Shuffle within each region, then deal from regions in turn,
+            # visiting regions in a random order each round
+            rx = xs * REGIONS // (xs.max() + 1)
+            ry = ys * REGIONS // (ys.max() + 1)
+            region = ry * REGIONS + rx
+            order = rng.permutation(len(negatives))
+            rank = np.zeros(len(negatives), dtype=int)
+            for r in np.unique(region) :
+                members = order[region[order] == r]
+                rank[members] = np.arange(len(members))
+            idx = np.lexsort((rng.rand(len(negatives)), rank))[:number]
+
+        elif strategy == 'hard' :
+            if sealions :
+                lion_x = np.array([c.x for c in sealions])
+                lion_y = np.array([c.y for c in sealions])
+                dist = np.sqrt(np.min((xs[:, None] - lion_x[None, :])**2 + 
+                                      (ys[:, None] - lion_y[None, :])**2, axis=1))
+                weight = np.exp(-dist / HARD_SCALE) + 1e-12
+            else :
+                weight = np.ones(len(negatives))
+            idx = rng.choice(len(negatives), number, replace=False, p=weight/weight.sum())
+
+        return [negatives[i] for i in np.sort(idx)]
+
+
+    def save_coords(self, train_ids=None, seed=0, strategy='uniform', processes=1): 
+        """Save coordinates of all train_ids. 
+
+        processes -- Extract in this many worker processes. Output is identical 
+            to a serial run, since negatives are seeded per train id.
+        """
         if train_ids is None: train_ids = self.train_ids
         fn = self.path('coords')
         self._progress('Saving sealion coordinates to {}'.format(fn))
-        with open(fn, 'w') as csvfile:
-            writer =csv.writer(csvfile)
-            writer.writerow( SeaLionCoord._fields )
-            for tid in train_ids :
-                self._progress()
-                for coord in self.coords(tid):
-                    writer.writerow(coord)
+        pool = None
+        if processes > 1 :
+            pool = multiprocessing.Pool(processes)
+            args = [(self.paths, tid, seed, strategy) for tid in train_ids]
+            results = pool.imap(_coords_worker, args)
+        else :
+            results = (self.coords(tid, seed, strategy) for tid in train_ids)
+        try :
+            with open(fn, 'w') as csvfile:
+                writer =csv.writer(csvfile)
+                writer.writerow( SeaLionCoord._fields )
+                for coords in results :
+                    self._progress()
+                    for coord in coords or []:
+                        writer.writerow(coord)
+        finally :
+            if pool is not None :
+                pool.close()
+                pool.join()
         self._progress('done')
         
     def load_coords(self):
@@ -485,139 +766,151 @@ class SeaLionData(object):
 # end SeaLionData
 
 
-##Count sea lion dots and compare to truth from train.csv
-sld = SeaLionData()
-sld.verbosity = VERBOSITY.VERBOSE
-#for tid in sld.trainshort_ids:
-#    coord = sld.coords(tid)
-#    sld.save_sea_lion_chunks_cropped(coord)
-    
+def _coords_worker(args):
+    """SeaLionData.coords in a worker process (SeaLionData itself doesn't pickle)"""
+    paths, tid, seed, strategy = args
+    sld = SeaLionData(verbosity=VERBOSITY.QUITE)
+    sld.paths = paths
+    return sld.coords(tid, seed, strategy)
 
-#for tid in sld.trainshort_ids:
-#    coord = sld.coords(tid)
-#    sld.save_sea_lion_chunks(coord, 92)
 
+def show(image) :
+    plt.imshow(image)
+    plt.show()
 
+def show2(image1, image2) :
+    _, (ax1, ax2) = plt.subplots(ncols = 2)
+    ax1.imshow(image1)
+    ax2.imshow(image2)
+    plt.show()
 
-#Make Cropped Sealions
-#Process:
-#input                              img = np.asarray(Image.open(fn))
-#Gray first?                        gray = skimage.color.rgb2gray(img)
-#Blur: Gaussian                     blurred = ndi.gaussian_filter(gray,3)
-#Canny Edge                         edges = skimage.feature.canny(blurred,2)
-#Dilate Edges (multiple times???)   dilated = skimage.morphology.dilation(edges)
-#Fill                               fill = ndi.binary_fill_holes(dilated)
-#Remove by coordinates?             label_objects, nb_labels = ndi.label(fill)
 
-#                                   x, y = label_objects.shape
-#                                   x //= 2
-#                                   y //= 2
-#                                   # Find the closest nonzero label to the center.
-#                                   tmp = label_objects[x,y]
-#                                   label_objects[x,y] = 0
-#                                   r,c = np.nonzero(label_objects)
-#                                   label_objects[x,y] = tmp
-#                                   min_idx = ((r - x)**2 + (c - y)**2).argmin()
-#                                   obj = label_objects[r[min_idx], c[min_idx]]
+# Script section. Guarded so that multiprocessing workers (spawned on Windows)
+# can import this module without running it.
+if __name__ == '__main__':
 
-#                                   label_objects[label_objects != obj] = 0
-#Find Contours                      contours = skimage.measure.find_contours(label_objects,0.5)
-#Get boundaries.
+    ##Count sea lion dots and compare to truth from train.csv
+    sld = SeaLionData()
+    sld.verbosity = VERBOSITY.VERBOSE
+    #for tid in sld.trainshort_ids:
+    #    coord = sld.coords(tid)
+    #    sld.save_sea_lion_chunks_cropped(coord)
 
 
+    #for tid in sld.trainshort_ids:
+    #    coord = sld.coords(tid)
+    #    sld.save_sea_lion_chunks(coord, 92)
 
-#Find large background rectangles.
-#Process:
 
-#Make 
-#Mask out all sealion locations.
 
+    #Make Cropped Sealions
+    #Process:
+    #input                              img = np.asarray(Image.open(fn))
+    #Gray first?                        gray = skimage.color.rgb2gray(img)
+    #Blur: Gaussian                     blurred = ndi.gaussian_filter(gray,3)
+    #Canny Edge                         edges = skimage.feature.canny(blurred,2)
+    #Dilate Edges (multiple times???)   dilated = skimage.morphology.dilation(edges)
+    #Fill                               fill = ndi.binary_fill_holes(dilated)
+    #Remove by coordinates?             label_objects, nb_labels = ndi.label(fill)
 
-def show(image) :
-    plt.imshow(image)
-    plt.show()
+    #                                   x, y = label_objects.shape
+    #                                   x //= 2
+    #                                   y //= 2
+    #                                   # Find the closest nonzero label to the center.
+    #                                   tmp = label_objects[x,y]
+    #                                   label_objects[x,y] = 0
+    #                                   r,c = np.nonzero(label_objects)
+    #                                   label_objects[x,y] = tmp
+    #                                   min_idx = ((r - x)**2 + (c - y)**2).argmin()
+    #                                   obj = label_objects[r[min_idx], c[min_idx]]
 
-def show2(image1, image2) :
-    _, (ax1, ax2) = plt.subplots(ncols = 2)
-    ax1.imshow(image1)
-    ax2.imshow(image2)
-    plt.show()
+    #                                   label_objects[label_objects != obj] = 0
+    #Find Contours                      contours = skimage.measure.find_contours(label_objects,0.5)
+    #Get boundaries.
+
+
+
+    #Find large background rectangles.
+    #Process:
+
+    #Make 
+    #Mask out all sealion locations.
+
+
+
+    train_id = 1
+
+    MIN_DIFFERENCE = 16
+    MIN_AREA = 9
+    MAX_AREA = 100
+    MAX_AVG_DIFF = 50
+    MAX_COLOR_DIFF = 32
+    img = np.asarray(sld.load_dotted_image(train_id))
+    src_img = np.asarray(sld.load_train_image(train_id, mask=True), dtype = np.float)
+    dot_img = np.asarray(sld.load_dotted_image(train_id), dtype = np.float)
+
+    img_diff = np.abs(src_img-dot_img)
+
+    img_diff = np.max(img_diff, axis=-1)
+    img_diff[img_diff<MIN_DIFFERENCE] = 0
+    img_diff[img_diff>=MIN_DIFFERENCE] = 255
+    less_noise = skimage.morphology.erosion(img_diff)
+    contours = skimage.measure.find_contours(less_noise.astype(float), 0.5)
+
+    positive_space = np.zeros(less_noise.shape)
+
+    for cnt in contours :
+        p = Polygon(shell=cnt)
+        y, x = p.centroid.coords[0]
+        y = int(round(y))
+        x = int(round(x))
+        #print(x, y)
+        #blocksize = 128
+        blocksize = 128 // 2
+        centersize = 8
+        #positive_space[y : y + blocksize, x : x + blocksize] = 255
+        #positive_space[y : y + centersize, x : x + centersize] = 80
+        positive_space[y - blocksize : y + blocksize, x - blocksize : x + blocksize] = 255
+        positive_space[y : y + centersize, x : x + centersize] = 80
+
+    #_, (ax1, ax2) = plt.subplots(ncols = 2)
+    #ax1.imshow(less_noise)
+    #ax2.imshow(positive_space)
+    #plt.show()
+
+
+    #has positive mask.
+
+
+    background_space = np.ones(positive_space.shape)
+    background_space[positive_space > 20] = 0
+    background_space[sld.load_mask(train_id)] = 0
+                                                       #(3744, 5616)
+    resize = scipy.misc.imresize(background_space, 1) #(37, 56)
+    resize[resize < 255] = 0
+
+    sq = skimage.morphology.square(3)
+    run1 = skimage.morphology.erosion(resize,sq)
+    run2 = skimage.morphology.erosion(run1)
+
+    show2(img, run1)
+
+    num_runs = 34
 
-train_id = 1
-
-MIN_DIFFERENCE = 16
-MIN_AREA = 9
-MAX_AREA = 100
-MAX_AVG_DIFF = 50
-MAX_COLOR_DIFF = 32
-img = np.asarray(sld.load_dotted_image(train_id))
-src_img = np.asarray(sld.load_train_image(train_id, mask=True), dtype = np.float)
-dot_img = np.asarray(sld.load_dotted_image(train_id), dtype = np.float)
-
-img_diff = np.abs(src_img-dot_img)
-
-img_diff = np.max(img_diff, axis=-1)
-img_diff[img_diff<MIN_DIFFERENCE] = 0
-img_diff[img_diff>=MIN_DIFFERENCE] = 255
-less_noise = skimage.morphology.erosion(img_diff)
-contours = skimage.measure.find_contours(less_noise.astype(float), 0.5)
-
-positive_space = np.zeros(less_noise.shape)
-
-for cnt in contours :
-    p = Polygon(shell=cnt)
-    y, x = p.centroid.coords[0]
-    y = int(round(y))
-    x = int(round(x))
-    #print(x, y)
-    #blocksize = 128
-    blocksize = 128 // 2
-    centersize = 8
-    #positive_space[y : y + blocksize, x : x + blocksize] = 255
-    #positive_space[y : y + centersize, x : x + centersize] = 80
-    positive_space[y - blocksize : y + blocksize, x - blocksize : x + blocksize] = 255
-    positive_space[y : y + centersize, x : x + centersize] = 80
-
-#_, (ax1, ax2) = plt.subplots(ncols = 2)
-#ax1.imshow(less_noise)
-#ax2.imshow(positive_space)
-#plt.show()
-
-
-#has positive mask.
-
-
-dots_mask = dot_img.astype(np.uint16).sum(axis=-1)
-
-background_space = np.ones(positive_space.shape)
-background_space[positive_space > 20] = 0
-background_space[dots_mask<40] = 0
-                                                   #(3744, 5616)
-resize = scipy.misc.imresize(background_space, 1) #(37, 56)
-resize[resize < 255] = 0
-
-sq = skimage.morphology.square(3)
-run1 = skimage.morphology.erosion(resize,sq)
-run2 = skimage.morphology.erosion(run1)
-
-show2(img, run1)
-
-num_runs = 34
-
-for i in range(num_runs) :
-    j, i  = run1.nonzero()
-    start = random.randint(0, len(i) - 1)
-    y, x = i[start], j[start]
-    #find largest rectangle.
-    #process:
-    #get nonzero indexes. random one as starting point
-    #build largest possible rectangle from there.
-    #skip if too small?
-    #store bounds, area
-    #label bounds as selected.
-
-    #skip if rectangle too small.
-    #exit if num_runs, or if skipped too many times in a row?
+    for i in range(num_runs) :
+        j, i  = run1.nonzero()
+        start = random.randint(0, len(i) - 1)
+        y, x = i[start], j[start]
+        #find largest rectangle.
+        #process:
+        #get nonzero indexes. random one as starting point
+        #build largest possible rectangle from there.
+        #skip if too small?
+        #store bounds, area
+        #label bounds as selected.
+
+        #skip if rectangle too small.
+        #exit if num_runs, or if skipped too many times in a row?
 
 
 
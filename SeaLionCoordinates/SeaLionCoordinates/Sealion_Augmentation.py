@@ -0,0 +1,114 @@
+'''Vectorized flip/shift augmentation for Sealion_CNN.py.
+
+Replaces ImageDataGenerator's per-sample shifts and flips with whole-batch
+array indexing. Chunks are saved larger than the network input by
+SeaLionData.save_sea_lion_chunks (e.g. chunksize=112 for 92 pixel crops),
+so a shift is just a crop at an integer offset from the centre: no
+interpolation and no fill. Flips are folded into the same gather by
+reversing the column indices.
+'''
+
+from __future__ import print_function
+import threading
+
+import numpy as np
+
+from Sealion_Training_Benchmark import StageTimer
+
+
+def center_crop(x, crop_size):
+    """Centre crop_size x crop_size window of a stack of chunks"""
+    height, width = x.shape[1:3]
+    top = (height - crop_size) // 2
+    left = (width - crop_size) // 2
+    return x[:, top:top + crop_size, left:left + crop_size]
+
+
+class BatchIterator(object):
+    """Endless, thread-safe iterator over shuffled batches of sample indices.
+
+    Subclasses implement _get_batch(batch, params). Any random draws they 
+    need go in _random_params(n), which runs under the same lock as the 
+    shuffle, so batches only depend on the seed, not on thread scheduling.
+    """
+
+    def __init__(self, samples, batch_size, shuffle=True, seed=None):
+        self.samples = samples
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.rng = np.random.RandomState(seed)
+        self.lock = threading.Lock()
+        self.index = np.arange(samples)
+        self.position = samples
+
+    def __len__(self):
+        """Batches per epoch"""
+        return int(np.ceil(self.samples / float(self.batch_size)))
+
+    def __iter__(self):
+        return self
+
+    def _random_params(self, n):
+        return None
+
+    def __next__(self):
+        with self.lock:
+            if self.position >= self.samples:
+                if self.shuffle: self.rng.shuffle(self.index)
+                self.position = 0
+            batch = self.index[self.position:self.position + self.batch_size]
+            self.position += self.batch_size
+            params = self._random_params(len(batch))
+        return self._get_batch(batch, params)
+
+    next = __next__  # Python 2
+
+
+class ChunkFlow(BatchIterator):
+    """Augmented (x, y) batches of crops from padded chunks.
+
+    x -- uint8 stack of padded chunks, (samples, height, width, channels)
+    crop_size -- Side of the crops fed to the network
+    shift_range -- Maximum shift, as fraction of crop_size (like ImageDataGenerator)
+        or whole pixels if an int. Limited to the padding available.
+    timer -- Sealion_Training_Benchmark.StageTimer to report load/augment time to
+    """
+
+    def __init__(self, x, y, crop_size, batch_size=64, shift_range=0.1, horizontal_flip=True,
+                 shuffle=True, seed=None, timer=None):
+        height, width = x.shape[1:3]
+        if height < crop_size or width < crop_size:
+            raise ValueError('Chunks ({}x{}) smaller than crop size {}'.format(height, width, crop_size))
+        super(ChunkFlow, self).__init__(len(x), batch_size, shuffle, seed)
+        self.x = x
+        self.y = y
+        self.crop_size = crop_size
+        self.horizontal_flip = horizontal_flip
+        self.timer = timer if timer is not None else StageTimer()
+
+        shift = shift_range if isinstance(shift_range, int) else int(round(shift_range * crop_size))
+        self.top = (height - crop_size) // 2
+        self.left = (width - crop_size) // 2
+        self.max_dy = min(shift, self.top, height - crop_size - self.top)
+        self.max_dx = min(shift, self.left, width - crop_size - self.left)
+
+    def _random_params(self, n):
+        dy = self.rng.randint(-self.max_dy, self.max_dy + 1, size=n)
+        dx = self.rng.randint(-self.max_dx, self.max_dx + 1, size=n)
+        flip = self.rng.rand(n) < 0.5 if self.horizontal_flip else np.zeros(n, dtype=bool)
+        return dy, dx, flip
+
+    def _get_batch(self, batch, params):
+        dy, dx, flip = params
+        with self.timer.time('load'):
+            chunks = self.x[batch]
+            batch_y = self.y[batch]
+        with self.timer.time('augment'):
+            offsets = np.arange(self.crop_size)
+            rows = (self.top + dy)[:, None] + offsets
+            cols = (self.left + dx)[:, None] + offsets
+            cols = np.where(flip[:, None], cols[:, ::-1], cols)
+            samples = np.arange(len(batch))[:, None, None]
+            batch_x = chunks[samples, rows[:, :, None], cols[:, None, :]].astype(np.float32)
+            batch_x /= 255
+        return batch_x, batch_y
@@ -6,6 +6,7 @@ It gets to 75% validation accuracy in 25 epochs, and 79% after 50 epochs.
 from __future__ import print_function
 import numpy as np
 import os
+import sys
 import scipy
 from scipy.misc import imread,imsave
 import keras
@@ -14,6 +15,8 @@ from keras.preprocessing.image import ImageDataGenerator
 from keras.models import Sequential
 from keras.layers import Dense, Dropout, Activation, Flatten
 from keras.layers import Conv2D, MaxPooling2D
+from Sealion_Training_Benchmark import StageTimer, ThroughputLogger, instrument_flow
+from Sealion_Augmentation import ChunkFlow, center_crop
 
 
 #Reads the input data.
@@ -42,10 +45,22 @@ batch_size = 64
 num_classes = 6
 epochs = 100
 data_augmentation = True
+# Vectorized augmentation crops shifted/flipped windows out of chunks saved larger
+# than the network input, e.g. SeaLionData.save_sea_lion_chunks(coords, 112)
+vectorized_augmentation = False
+padded_chunk_path = r'D:\temp\sealion\chunks_padded'
+crop_size = 92
+workers = 4
 #num_predictions = 20
 save_dir = os.path.join(os.getcwd(), 'saved_models')
 print(save_dir)
 model_name = 'keras_sealions_trained_less2_model.h5'
+# Benchmark mode: short run recording per epoch/step timings to a json file
+benchmark = False
+benchmark_epochs = 3
+benchmark_path = os.path.join(save_dir, 'training_benchmark_b{}_w{}.json'.format(batch_size, workers))
+if benchmark:
+    epochs = benchmark_epochs
 #
 #train_url = r'C:\Users\Ys\Source\Repos\Kaggle_Sealions_Harr_Features\SeaLionCoordinates\SeaLionCoordinates\chunks\92'
 #test_url = r'C:\Users\Ys\Source\Repos\Kaggle_Sealions_Harr_Features\SeaLionCoordinates\SeaLionCoordinates\chunks\other92'
@@ -53,11 +68,18 @@ model_name = 'keras_sealions_trained_less2_model.h5'
 #x_test, y_test = input_test(test_url)
 #
 chunk_path = r'D:\temp\sealion\chunks_less'
+if data_augmentation and vectorized_augmentation:
+    chunk_path = padded_chunk_path
 chunks, classes = input_train(chunk_path)
 train_ratio = 0.7
 train_amount = int(round(len(chunks) * train_ratio))
 x_train, y_train = chunks[0:train_amount] , classes[0:train_amount]
 x_test, y_test = chunks[train_amount:-1] , classes[train_amount:-1]
+if data_augmentation and vectorized_augmentation:
+    # Keep uint8 padded chunks for augmentation, network sees centre crops
+    x_train_padded = x_train
+    x_train = center_crop(x_train, crop_size)
+    x_test = center_crop(x_test, crop_size)
 # The data, shuffled and split between train and test sets:
 #(x_train, y_train), (x_test, y_test) = cifar10.load_data()
 print('x_train shape:', x_train.shape)
@@ -109,13 +131,36 @@ x_test = x_test.astype('float32')
 x_train /= 255
 x_test /= 255
 
+callbacks = []
+timer = StageTimer()
+if benchmark:
+    print('Benchmarking for %d epochs.' % epochs)
+    callbacks.append(ThroughputLogger(benchmark_path, batch_size, timer,
+                                      config={'batch_size': batch_size,
+                                              'workers': workers,
+                                              'data_augmentation': data_augmentation,
+                                              'vectorized_augmentation': vectorized_augmentation,
+                                              'train_samples': x_train.shape[0]}))
+
 if not data_augmentation:
     print('Not using data augmentation.')
     model.fit(x_train, y_train,
               batch_size=batch_size,
               epochs=epochs,
               validation_data=(x_test, y_test),
-              shuffle=True)
+              shuffle=True,
+              callbacks=callbacks)
+elif vectorized_augmentation:
+    print('Using vectorized data augmentation.')
+    # Same shifts and flips as the ImageDataGenerator below, whole batches at a time
+    flow = ChunkFlow(x_train_padded, y_train, crop_size, batch_size,
+                     shift_range=0.1, horizontal_flip=True, timer=timer)
+    model.fit_generator(flow,
+                        steps_per_epoch=len(flow),
+                        epochs=epochs,
+                        validation_data=(x_test, y_test),
+                        workers=workers,
+                        callbacks=callbacks)
 else:
     print('Using real-time data augmentation.')
     # This will do preprocessing and realtime data augmentation:
@@ -136,12 +181,21 @@ else:
     datagen.fit(x_train)
 
     # Fit the model on the batches generated by datagen.flow().
-    model.fit_generator(datagen.flow(x_train, y_train,
-                                     batch_size=batch_size),
+    flow = datagen.flow(x_train, y_train, batch_size=batch_size)
+    if benchmark:
+        # Time load and augmentation of the same flow
+        instrument_flow(flow, datagen, timer)
+    model.fit_generator(flow,
                         steps_per_epoch=int(np.ceil(x_train.shape[0] / float(batch_size))),
                         epochs=epochs,
                         validation_data=(x_test, y_test),
-                        workers=4)
+                        workers=workers,
+                        callbacks=callbacks)
+
+# A benchmark run is barely trained: don't overwrite the saved model or score it
+if benchmark:
+    print('Benchmark run finished, model not saved.')
+    sys.exit(0)
 
 # Save model and weights
 if not os.path.isdir(save_dir):
@@ -0,0 +1,194 @@
+'''CPU inference for the sealion CNN trained by Sealion_CNN.py, without Keras.
+
+Loads the saved .h5 model and runs the forward pass in NumPy: convolutions
+are im2col + GEMM, batches are spread over a thread pool (NumPy releases the
+GIL inside matrix multiplies), and uint8 chunks are normalized one batch at
+a time instead of converting the whole dataset to float32 up front.
+
+python Sealion_CNN_Inference.py saved_models\keras_sealions_trained_less2_model.h5 D:\temp\sealion\chunks_less
+'''
+
+from __future__ import print_function
+import sys
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import h5py
+from PIL import Image
+
+
+def _decode(value):
+    return value.decode('utf8') if isinstance(value, bytes) else value
+
+
+def load_model(model_path):
+    """Read a Keras Sequential model from .h5 into a list of (layer_type, params)"""
+    with h5py.File(model_path, 'r') as f:
+        config = json.loads(_decode(f.attrs['model_config']))['config']
+        if isinstance(config, dict): config = config['layers']
+        weights = f['model_weights'] if 'model_weights' in f else f
+
+        layers = []
+        for layer in config:
+            cls, cfg = layer['class_name'], layer['config']
+            if cls in ('Conv2D', 'Dense'):
+                if not cfg.get('use_bias', True):
+                    raise ValueError('Only layers with bias supported: {}'.format(cfg['name']))
+                if cls == 'Conv2D':
+                    if tuple(cfg.get('strides', (1, 1))) != (1, 1):
+                        raise ValueError('Only unit stride convolutions supported')
+                    if tuple(cfg.get('dilation_rate', (1, 1))) != (1, 1):
+                        raise ValueError('Only undilated convolutions supported')
+                    if cfg.get('data_format', 'channels_last') != 'channels_last':
+                        raise ValueError('Only channels_last convolutions supported')
+                g = weights[cfg['name']]
+                kernel, bias = [np.asarray(g[_decode(n)], dtype=np.float32) for n in g.attrs['weight_names']]
+                if cls == 'Conv2D':
+                    layers.append(('conv', (kernel, bias, cfg['padding'])))
+                    if cfg.get('activation', 'linear') != 'linear':
+                        layers.append(('activation', cfg['activation']))
+                else:
+                    layers.append(('dense', (kernel, bias)))
+                    if cfg.get('activation', 'linear') != 'linear':
+                        layers.append(('activation', cfg['activation']))
+            elif cls == 'Activation':
+                layers.append(('activation', cfg['activation']))
+            elif cls == 'MaxPooling2D':
+                if cfg.get('data_format', 'channels_last') != 'channels_last':
+                    raise ValueError('Only channels_last pooling supported')
+                if cfg.get('padding', 'valid') != 'valid' or \
+                   tuple(cfg.get('strides') or cfg['pool_size']) != tuple(cfg['pool_size']):
+                    raise ValueError('Only valid, non-overlapping pooling supported')
+                layers.append(('maxpool', tuple(cfg['pool_size'])))
+            elif cls == 'Flatten':
+                if cfg.get('data_format', 'channels_last') != 'channels_last':
+                    raise ValueError('Only channels_last flatten supported')
+                layers.append(('flatten', None))
+            elif cls in ('Dropout', 'InputLayer'):
+                pass    # No-ops at inference time
+            else:
+                raise ValueError('Unsupported layer: {}'.format(cls))
+    return layers
+
+
+def conv2d(x, kernel, bias, padding):
+    """2D convolution (cross-correlation, as Keras) of NHWC batch by im2col and GEMM"""
+    kh, kw, channels, filters = kernel.shape
+    if padding == 'same':
+        ph, pw = kh - 1, kw - 1
+        x = np.pad(x, ((0, 0), (ph//2, ph - ph//2), (pw//2, pw - pw//2), (0, 0)), mode='constant')
+    n, height, width, _ = x.shape
+    out_h, out_w = height - kh + 1, width - kw + 1
+
+    s0, s1, s2, s3 = x.strides
+    cols = np.lib.stride_tricks.as_strided(x, shape=(n, out_h, out_w, kh, kw, channels),
+                                           strides=(s0, s1, s2, s1, s2, s3))
+    cols = cols.reshape(n * out_h * out_w, kh * kw * channels)
+    out = np.dot(cols, kernel.reshape(kh * kw * channels, filters))
+    out += bias
+    return out.reshape(n, out_h, out_w, filters)
+
+
+def maxpool2d(x, pool_size):
+    ph, pw = pool_size
+    n, height, width, channels = x.shape
+    height, width = height // ph, width // pw
+    x = x[:, :height * ph, :width * pw, :]
+    return x.reshape(n, height, ph, width, pw, channels).max(axis=(2, 4))
+
+
+def activation(x, name):
+    if name == 'relu':
+        return np.maximum(x, 0, out=x)
+    elif name == 'softmax':
+        x = np.exp(x - x.max(axis=-1, keepdims=True))
+        return x / x.sum(axis=-1, keepdims=True)
+    elif name == 'linear':
+        return x
+    raise ValueError('Unsupported activation: {}'.format(name))
+
+
+def forward(layers, x):
+    """Forward pass of one batch. uint8 input is normalized to [0, 1]"""
+    if x.dtype == np.uint8:
+        x = x.astype(np.float32)
+        x /= 255
+    for kind, params in layers:
+        if kind == 'conv':
+            x = conv2d(x, *params)
+        elif kind == 'dense':
+            x = np.dot(x, params[0]) + params[1]
+        elif kind == 'activation':
+            x = activation(x, params)
+        elif kind == 'maxpool':
+            x = maxpool2d(x, params)
+        elif kind == 'flatten':
+            x = x.reshape(x.shape[0], -1)
+    return x
+
+
+def predict(layers, x, batch_size=64, workers=4):
+    """Class probabilities for a stack of image chunks, batches run on a thread pool"""
+    batches = [x[i:i + batch_size] for i in range(0, len(x), batch_size)]
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda b: forward(layers, b), batches))
+    else:
+        results = [forward(layers, b) for b in batches]
+    return np.concatenate(results)
+
+
+def load_chunks(chunk_path):
+    """Chunk images as a uint8 stack, same order as Sealion_CNN.input_train"""
+    return np.stack([np.asarray(Image.open(os.path.join(chunk_path, file)))
+                     for file in os.listdir(chunk_path)])
+
+
+def benchmark(model_path, x, batch_size=64, workers=4, repeats=3):
+    """Time NumPy inference against Keras model.predict. Returns dict of results"""
+    layers = load_model(model_path)
+    results = {'patches': len(x), 'batch_size': batch_size, 'workers': workers}
+
+    best = None
+    for _ in range(repeats):
+        start = time.time()
+        res = predict(layers, x, batch_size, workers)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    results['numpy_patches_per_sec'] = len(x) / best
+    print('NumPy: {:.1f} patches/sec'.format(results['numpy_patches_per_sec']))
+
+    try:
+        import keras
+    except ImportError:
+        print('Keras not available, skipping baseline')
+        return results
+
+    model = keras.models.load_model(model_path)
+    best = None
+    for _ in range(repeats):
+        start = time.time()
+        x_float = x.astype('float32')
+        x_float /= 255
+        keras_res = model.predict(x_float, batch_size)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    results['keras_patches_per_sec'] = len(x) / best
+    results['speedup'] = results['numpy_patches_per_sec'] / results['keras_patches_per_sec']
+    results['max_abs_diff'] = float(np.abs(res - keras_res).max())
+    print('Keras: {:.1f} patches/sec'.format(results['keras_patches_per_sec']))
+    print('Speedup: {:.2f}x, max abs difference: {:.2g}'.format(results['speedup'], results['max_abs_diff']))
+    return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print('Usage: python Sealion_CNN_Inference.py model.h5 chunk_dir [batch_size] [workers]')
+        sys.exit(1)
+    model_path, chunk_path = sys.argv[1:3]
+    batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+    benchmark(model_path, load_chunks(chunk_path), batch_size, workers)
@@ -0,0 +1,171 @@
+'''Training throughput instrumentation for Sealion_CNN.py.
+
+StageTimer accumulates wall time per stage ('load', 'augment', ...) from any
+thread. instrument_flow() times the real ImageDataGenerator.flow pipeline in
+place, so the benchmark measures exactly what training runs. ThroughputLogger
+is a Keras callback recording per-step and per-epoch timings, samples/sec and
+peak memory, and writes them all to a JSON file when training ends.
+
+With workers > 0 the data stages run in background threads, overlapped with
+the model. 'data_wait' is the part of the training steps' wall time not spent
+inside a step, i.e. time the model sat waiting for batches. Validation, which
+Keras runs after the last step, is recorded separately as 'validation_time'.
+'''
+
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import keras
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process in MB, or None if unknown"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak / (1024. * 1024.) if sys.platform == 'darwin' else peak / 1024.
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / (1024. * 1024.)
+    except ImportError:
+        return None
+
+
+class StageTimer(object):
+    """Thread-safe accumulator of time spent per named stage"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.totals = {}
+        self.counts = {}
+
+    @contextmanager
+    def time(self, stage):
+        start = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start
+            with self.lock:
+                self.totals[stage] = self.totals.get(stage, 0.) + elapsed
+                self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.totals)
+
+
+def _timed(func, timer, stage):
+    def timed(*args, **kwargs):
+        with timer.time(stage):
+            return func(*args, **kwargs)
+    return timed
+
+
+def instrument_flow(flow, datagen, timer):
+    """Time an ImageDataGenerator.flow iterator in place and return it.
+
+    The datagen's augmentation methods are timed as 'augment', and the flow's
+    batch assembly (gathering samples plus their augmentation) as 'batch'.
+    The flow keeps its type, so fit_generator drives it as in a normal run.
+    """
+    # Keras >= 2.2 flows call get_random_transform/apply_transform, older random_transform
+    if hasattr(datagen, 'apply_transform'):
+        names = ('get_random_transform', 'apply_transform', 'standardize')
+    else:
+        names = ('random_transform', 'standardize')
+    for name in names:
+        setattr(datagen, name, _timed(getattr(datagen, name), timer, 'augment'))
+
+    # Keras >= 2.1 assembles batches here, older versions in next()
+    if hasattr(flow, '_get_batches_of_transformed_samples'):
+        name = '_get_batches_of_transformed_samples'
+    else:
+        name = 'next'
+    setattr(flow, name, _timed(getattr(flow, name), timer, 'batch'))
+    return flow
+
+
+class ThroughputLogger(keras.callbacks.Callback):
+    """Record per-step and per-epoch timings and write them to json_path"""
+
+    def __init__(self, json_path, batch_size, timer=None, config=None):
+        super(ThroughputLogger, self).__init__()
+        self.json_path = json_path
+        self.batch_size = batch_size
+        self.timer = timer if timer is not None else StageTimer()
+        self.config = config or {}
+        self.epochs = []
+
+    def on_train_begin(self, logs=None):
+        self.train_start = time.time()
+        self.epochs = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch_start = time.time()
+        self.step_times = []
+        self.samples = 0
+        self.train_end = self.epoch_start
+        self.stages_start = self.timer.snapshot()
+
+    def on_batch_begin(self, batch, logs=None):
+        self.step_start = time.time()
+
+    def on_batch_end(self, batch, logs=None):
+        self.train_end = time.time()
+        self.step_times.append(self.train_end - self.step_start)
+        self.samples += (logs or {}).get('size', self.batch_size)
+
+    def on_epoch_end(self, epoch, logs=None):
+        epoch_time = time.time() - self.epoch_start
+        # Training steps only, validation runs between the last step and here
+        train_time = self.train_end - self.epoch_start
+        model_time = float(np.sum(self.step_times))
+        stages = self.timer.snapshot()
+        record = {
+            'epoch': epoch,
+            'epoch_time': epoch_time,
+            'train_time': train_time,
+            'validation_time': epoch_time - train_time,
+            'steps': len(self.step_times),
+            'samples': self.samples,
+            'samples_per_sec': self.samples / train_time if train_time > 0 else None,
+            'model_time': model_time,
+            'data_wait': train_time - model_time,
+            'step_time_mean': float(np.mean(self.step_times)) if self.step_times else None,
+            'step_time_max': float(np.max(self.step_times)) if self.step_times else None,
+            'step_times': self.step_times,
+            'peak_memory_mb': peak_memory_mb(),
+            }
+        for stage, total in stages.items():
+            record[stage + '_time'] = total - self.stages_start.get(stage, 0.)
+        if 'batch_time' in record and 'load_time' not in record:
+            # instrument_flow: batch assembly is loading plus augmentation
+            record['load_time'] = record['batch_time'] - record.get('augment_time', 0.)
+        self.epochs.append(record)
+        print(' - {:.1f} samples/sec, model {:.1f}s, data wait {:.1f}s, validation {:.1f}s'.format(
+            record['samples_per_sec'] or 0, model_time, record['data_wait'], record['validation_time']))
+
+    def on_train_end(self, logs=None):
+        results = {
+            'config': self.config,
+            'total_time': time.time() - self.train_start,
+            'peak_memory_mb': peak_memory_mb(),
+            'epochs': self.epochs,
+            }
+        directory = os.path.dirname(self.json_path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(self.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print('Saved training benchmark at %s ' % self.json_path)